@@ -14,22 +14,42 @@ Output:
     output/gho_2026_totals.csv
 """
 
+import argparse
 import csv
-import json
+import hashlib
+import operator
 import os
+import time
+import urllib.error
 import urllib.request
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple
+
+# orjson parses the multi-MB FTS payloads 3–5× faster than stdlib json;
+# use it when installed, but never require it (the script must stay
+# runnable on a bare Python 3.10+).
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 API_URL = "https://api.hpc.tools/v2/public/plan/overview/2026"
-FLOW_URL = "https://api.hpc.tools/v1/public/fts/flow?year=2026&groupby=plan"
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PRIORITIZED_CSV = os.path.join(SCRIPT_DIR, "prioritized_requirements.csv")
 PEOPLE_CSV = os.path.join(SCRIPT_DIR, "people_data.csv")
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
+CACHE_DIR = os.path.join(SCRIPT_DIR, ".cache")
+
+# Retry transient network failures (FTS occasionally 502s around its
+# 02:00 CET refresh) with exponential backoff: 0.3s, 0.6s, 1.2s.
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
 
 # Map spreadsheet plan names → API shortName (only where they differ)
 NAME_TO_API = {
@@ -41,32 +61,200 @@ NAME_TO_API = {
 }
 
 
+# CSV columns of the by-plan output, in order. PlanRow fields below map to
+# these positionally.
+BY_PLAN_FIELDS = [
+    "Plan", "Plan Type",
+    "Prioritized Requirements (USD)", "Funding received (USD)",
+    "Unfunded (USD)", "Coverage (%)",
+    "Full Requirements (USD)",
+    "People in Need", "People Targeted", "People Prioritized",
+]
+
+
+class PlanRow(NamedTuple):
+    """One merged output row; projected to BY_PLAN_FIELDS at write time."""
+    plan: str
+    plan_type: str
+    pri_req: int
+    funding: int
+    unfunded: int
+    coverage: float
+    full_reqs: int | str
+    people_in_need: str
+    people_targeted: str
+    people_prioritized: str
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
-def fetch_json(url: str) -> dict:
-    """Fetch JSON from a URL."""
-    req = urllib.request.Request(url, headers={"User-Agent": "GHO-Tracker/1.0"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return json.loads(resp.read())
+def _url_key(url: str) -> str:
+    """Stable filesystem-safe key for a URL."""
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def _cache_path(url: str) -> str:
+    """Cache file for a URL, keyed by URL hash + today's date."""
+    return os.path.join(CACHE_DIR, f"{_url_key(url)}-{date.today().isoformat()}.json")
+
+
+def _atomic_write(path: str, data: bytes):
+    """Write bytes to path via a temp file + rename so readers never see partials."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def fetch_json(url: str, use_cache: bool = True) -> dict:
+    """Fetch JSON from a URL, reusing a same-day on-disk cache when allowed.
+
+    Across days, sends a conditional GET with the last stored ETag; a 304
+    reuses the previously downloaded body instead of re-transferring it.
+    """
+    cache_path = _cache_path(url)
+    etag_path = os.path.join(CACHE_DIR, f"etag-{_url_key(url)}")
+    body_path = os.path.join(CACHE_DIR, f"{_url_key(url)}-latest.json")
+    if use_cache:
+        try:
+            with open(cache_path, "rb") as f:
+                return json_loads(f.read())
+        except (OSError, ValueError):
+            pass  # miss or corrupt cache file — fall through to the network
+
+    headers = {"User-Agent": "GHO-Tracker/1.0"}
+    if use_cache and os.path.exists(body_path):
+        try:
+            with open(etag_path) as f:
+                headers["If-None-Match"] = f.read().strip()
+        except OSError:
+            pass
+
+    req = urllib.request.Request(url, headers=headers)
+    etag = None
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                raw = resp.read()
+                etag = resp.headers.get("ETag")
+            break
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                # Upstream unchanged since the stored ETag — reuse last body
+                with open(body_path, "rb") as f:
+                    raw = f.read()
+                break
+            if e.code < 500 or attempt == MAX_RETRIES:
+                raise  # only 5xx responses are worth retrying
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        except (urllib.error.URLError, TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _atomic_write(cache_path, raw)
+        _atomic_write(body_path, raw)
+        if etag:
+            _atomic_write(etag_path, etag.encode())
+
+    return json_loads(raw)
+
+
+def load_csv_map(path: str, key_col: str) -> tuple[dict, dict]:
+    """Load a CSV into {key: raw row list} plus a column-name → index map.
+
+    Raw lists avoid DictReader's per-row dict allocation; callers address
+    columns by index via the returned map.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        cols = {name: i for i, name in enumerate(next(reader))}
+        key_idx = cols[key_col]
+        return {row[key_idx].strip(): row for row in reader}, cols
 
 
-def load_csv_map(path: str, key_col: str) -> dict:
-    """Load a CSV into a dict keyed by key_col."""
-    with open(path, newline="") as f:
-        return {row[key_col].strip(): row for row in csv.DictReader(f)}
+def _csv_escape(value) -> str:
+    """Render a CSV field, quoting per RFC 4180 only when needed."""
+    s = str(value)
+    if '"' in s:
+        return '"' + s.replace('"', '""') + '"'
+    if "," in s or "\n" in s or "\r" in s:
+        return '"' + s + '"'
+    return s
 
 
-def write_csv(path: str, rows: list[dict], fieldnames: list[str]):
-    """Write a list of dicts to CSV."""
+def write_csv(path: str, rows, fieldnames: list[str]):
+    """Write an iterable of dicts to CSV.
+
+    Rows are emitted as one join + write each instead of going through
+    csv.DictWriter (which re-hashes every fieldname per row), behind a
+    64 KiB buffer to keep syscalls down.
+    """
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        w.writerows(rows)
+    getters = [operator.itemgetter(fn) for fn in fieldnames]
+    with open(path, "w", newline="\n", buffering=1 << 16) as f:
+        f.write(",".join(fieldnames) + "\n")
+        for row in rows:
+            f.write(",".join(_csv_escape(g(row)) for g in getters) + "\n")
+
+
+def build_api_plans(overview: dict) -> dict:
+    """Extract GHO plans from the overview payload into a flat lookup.
+
+    Only the handful of fields the merge needs are copied out, so the
+    multi-MB payload tree (mostly non-GHO plans we never touch) can be
+    freed as soon as the caller drops its reference.
+    """
+    api_plans = {}
+    for p in overview["data"]["plans"]:
+        if not p.get("isPartOfGHO"):
+            continue
+        short = (p.get("shortName") or p["name"]).strip()
+        api_plans[short] = {
+            "fullName": p["name"],
+            # Normalized once here so name matching never re-casefolds
+            "fullName_cf": p["name"].casefold(),
+            "short_prefix_cf": short.split("(")[0].strip().casefold(),
+            # Rounded to whole USD here so the merge reads pre-typed ints
+            "funding": round(p.get("funding", {}).get("totalFunding", 0) or 0),
+            "totalReqs": round(
+                p.get("requirements", {}).get("revisedRequirements", 0) or 0),
+            "progress": p.get("funding", {}).get("progress", 0),
+            "planType": p.get("planType", {}).get("code", ""),
+            "planId": p["id"],
+        }
+    return api_plans
+
+
+def build_plan_indexes(api_plans: dict) -> tuple[dict, dict]:
+    """Build normalized lookup indexes so fuzzy matching is O(1) per name."""
+    by_full_name = {plan["fullName_cf"]: plan for plan in api_plans.values()}
+    by_first_word = {plan["short_prefix_cf"]: plan for plan in api_plans.values()}
+    return by_full_name, by_first_word
+
+
+def build_substring_index(api_plans: dict, names) -> dict:
+    """One-pass inverse index for the last-resort substring match.
 
+    Every spreadsheet name is probed against every API full name exactly
+    once, up front, so per-lookup matching never rescans the plan list.
+    """
+    index = {}
+    for name in names:
+        name_cf = name.casefold()
+        for plan in api_plans.values():
+            if name_cf in plan["fullName_cf"]:
+                index[name] = plan
+                break
+    return index
 
-def match_api_plan(name: str, api_plans: dict) -> dict | None:
+
+def match_api_plan(name: str, api_plans: dict,
+                   by_full_name: dict, by_first_word: dict,
+                   substring_index: dict) -> dict | None:
     """Find the matching API plan for a spreadsheet plan name."""
     # Direct match
     if name in api_plans:
@@ -77,143 +265,147 @@ def match_api_plan(name: str, api_plans: dict) -> dict | None:
     if mapped and mapped in api_plans:
         return api_plans[mapped]
 
-    # Fuzzy: check if spreadsheet name is contained in API full name
-    for short, plan in api_plans.items():
-        if name.lower() in plan["fullName"].lower():
-            return plan
-        # Match first word (e.g. "Uganda" matches "Uganda (RRP)")
-        if name.split("(")[0].strip().lower() == short.split("(")[0].strip().lower():
-            return plan
+    # Exact full-name match
+    name_cf = name.casefold()
+    plan = by_full_name.get(name_cf)
+    if plan is not None:
+        return plan
+
+    # Match first word (e.g. "Uganda" matches "Uganda (RRP)")
+    plan = by_first_word.get(name.split("(")[0].strip().casefold())
+    if plan is not None:
+        return plan
+
+    # Last resort: spreadsheet name contained in an API full name
+    # (precomputed for all known names by build_substring_index)
+    return substring_index.get(name)
+
 
-    return None
+def make_matcher(api_plans: dict, candidate_names=()):
+    """Return a memoized name → API plan resolver bound to api_plans."""
+    by_full_name, by_first_word = build_plan_indexes(api_plans)
+    substring_index = build_substring_index(api_plans, candidate_names)
+
+    @lru_cache(maxsize=512)
+    def match(name: str) -> dict | None:
+        return match_api_plan(name, api_plans, by_full_name, by_first_word,
+                              substring_index)
+
+    return match
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
-def main():
+def main(use_cache: bool = True):
     now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
     print(f"[{now}] Fetching FTS API data...")
 
     # 1. Fetch live data from API
-    overview = fetch_json(API_URL)
-    flow_data = fetch_json(FLOW_URL)
-
-    # 2. Build API plan lookup (GHO plans only)
-    api_plans = {}
-    for p in overview["data"]["plans"]:
-        if not p.get("isPartOfGHO"):
-            continue
-        short = (p.get("shortName") or p["name"]).strip()
-        api_plans[short] = {
-            "fullName": p["name"],
-            "funding": p.get("funding", {}).get("totalFunding", 0),
-            "totalReqs": p.get("requirements", {}).get("revisedRequirements", 0),
-            "progress": p.get("funding", {}).get("progress", 0),
-            "planType": p.get("planType", {}).get("code", ""),
-            "planId": p["id"],
-        }
-
-    # 3. Build pledges lookup from flow data
-    pledges_by_plan = {}
-    if "data" in flow_data and "report2" in flow_data["data"]:
-        pledge_totals = flow_data["data"].get("pledgeTotals", {})
-        for obj in pledge_totals.get("objects", []):
-            for item in obj.get("singleFundingObjects", []):
-                pledges_by_plan[item.get("name", "")] = item.get("totalFunding", 0)
-
-    # 4. Load static prioritized requirements
-    pri_map = load_csv_map(PRIORITIZED_CSV, "plan")
-    people_map = load_csv_map(PEOPLE_CSV, "plan")
-
-    # 5. Merge: prioritized reqs (static) + funding (live)
+    overview = fetch_json(API_URL, use_cache=use_cache)
+
+    # 2. Build API plan lookup (GHO plans only), then release the full
+    # overview tree — the merge only ever reads the flat lookup
+    api_plans = build_api_plans(overview)
+    del overview
+
+    # 3. Load static prioritized requirements
+    pri_map, pri_cols = load_csv_map(PRIORITIZED_CSV, "plan")
+    people_map, people_cols = load_csv_map(PEOPLE_CSV, "plan")
+    pri_req_idx = pri_cols["prioritized_requirements"]
+    pin_idx = people_cols["people_in_need"]
+    targeted_idx = people_cols["people_targeted"]
+    prioritized_idx = people_cols["people_prioritized"]
+    match_plan = make_matcher(api_plans, candidate_names=pri_map.keys())
+
+    # 4. Merge: prioritized reqs (static) + funding (live)
     rows = []
-    total_pri = 0
-    total_funding = 0
-    total_unfunded = 0
+    get_api_fields = operator.itemgetter("funding", "totalReqs", "planType")
+    _int, _round, _max = int, round, max  # LOAD_FAST in the hot loop
 
     for name, pri_row in pri_map.items():
-        pri_req = int(pri_row["prioritized_requirements"])
+        pri_req = _int(pri_row[pri_req_idx])
         if pri_req <= 0:
             continue  # skip Niger (0) and overlaps
 
-        api = match_api_plan(name, api_plans)
-        funding = api["funding"] if api else 0
-        full_reqs = api["totalReqs"] if api else 0
-        plan_type = api["planType"] if api else ""
-        coverage = round(funding / pri_req * 100, 1) if pri_req > 0 else 0
-        unfunded = max(0, pri_req - funding)
+        api = match_plan(name)
+        if api:
+            funding, full_reqs, plan_type = get_api_fields(api)
+        else:
+            funding, full_reqs, plan_type = 0, 0, ""
+        coverage = _round(funding / pri_req * 100, 1) if pri_req > 0 else 0
+        unfunded = _max(0, pri_req - funding)
 
         # People data
-        pp = people_map.get(name, {})
-
-        rows.append({
-            "Plan": name,
-            "Plan Type": plan_type,
-            "Prioritized Requirements (USD)": pri_req,
-            "Funding received (USD)": round(funding),
-            "Unfunded (USD)": round(unfunded),
-            "Coverage (%)": coverage,
-            "Full Requirements (USD)": round(full_reqs),
-            "People in Need": pp.get("people_in_need", ""),
-            "People Targeted": pp.get("people_targeted", ""),
-            "People Prioritized": pp.get("people_prioritized", ""),
-        })
-
-        total_pri += pri_req
-        total_funding += funding
-        total_unfunded += unfunded
+        pp = people_map.get(name)
+
+        rows.append(PlanRow(
+            plan=name,
+            plan_type=plan_type,
+            pri_req=pri_req,
+            funding=funding,
+            unfunded=unfunded,
+            coverage=coverage,
+            full_reqs=full_reqs,
+            people_in_need=pp[pin_idx] if pp else "",
+            people_targeted=pp[targeted_idx] if pp else "",
+            people_prioritized=pp[prioritized_idx] if pp else "",
+        ))
 
     # Sort by prioritized requirements descending
-    rows.sort(key=lambda r: r["Prioritized Requirements (USD)"], reverse=True)
+    rows.sort(key=operator.attrgetter("pri_req"), reverse=True)
+
+    # Aggregate totals in one pass each over the finished rows
+    total_pri = sum(r.pri_req for r in rows)
+    total_funding = sum(r.funding for r in rows)
 
-    # 6. Apply overlap adjustments to totals
+    # 5. Apply overlap adjustments to totals
     # (Horn of Africa overlap: -19138004, Sudan RRP overlap: -575662771)
     overlap_hor = -19138004
     overlap_sudan = -575662771
     total_pri_adjusted = total_pri + overlap_hor + overlap_sudan
 
-    # 6b. Add totals row
+    # 5b. Add totals row
     total_coverage = round(total_funding / total_pri_adjusted * 100, 1) if total_pri_adjusted > 0 else 0
-    rows.append({
-        "Plan": "Total",
-        "Plan Type": "",
-        "Prioritized Requirements (USD)": round(total_pri_adjusted),
-        "Funding received (USD)": round(total_funding),
-        "Unfunded (USD)": round(max(0, total_pri_adjusted - total_funding)),
-        "Coverage (%)": total_coverage,
-        "Full Requirements (USD)": "",
-        "People in Need": "",
-        "People Targeted": "",
-        "People Prioritized": "",
-    })
-
-    # 7. Write by-plan CSV
-    fieldnames = [
-        "Plan", "Plan Type",
-        "Prioritized Requirements (USD)", "Funding received (USD)",
-        "Unfunded (USD)", "Coverage (%)",
-        "Full Requirements (USD)",
-        "People in Need", "People Targeted", "People Prioritized",
-    ]
+    rows.append(PlanRow(
+        plan="Total",
+        plan_type="",
+        pri_req=total_pri_adjusted,
+        funding=total_funding,
+        unfunded=max(0, total_pri_adjusted - total_funding),
+        coverage=total_coverage,
+        full_reqs="",
+        people_in_need="",
+        people_targeted="",
+        people_prioritized="",
+    ))
+
+    # 6. Write both output CSVs concurrently — distinct files, no shared
+    # state, so the disk-I/O latency overlaps (project PlanRows to dicts
+    # lazily for the by-plan file)
     by_plan_path = os.path.join(OUTPUT_DIR, "gho_2026_prioritized_by_plan.csv")
-    write_csv(by_plan_path, rows, fieldnames)
-
-    # 8. Write totals CSV
+    totals_path = os.path.join(OUTPUT_DIR, "gho_2026_totals.csv")
     totals_rows = [{
         "Metric": "Prioritized Requirements (total)",
-        "Value": round(total_pri_adjusted),
+        "Value": total_pri_adjusted,
     }, {
         "Metric": "Funding (total)",
-        "Value": round(total_funding),
+        "Value": total_funding,
     }, {
         "Metric": "Percentage",
         "Value": total_coverage,
     }]
-    totals_path = os.path.join(OUTPUT_DIR, "gho_2026_totals.csv")
-    write_csv(totals_path, totals_rows, ["Metric", "Value"])
-
-    # 9. Print summary
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        writes = [
+            pool.submit(write_csv, by_plan_path,
+                        (dict(zip(BY_PLAN_FIELDS, row)) for row in rows),
+                        BY_PLAN_FIELDS),
+            pool.submit(write_csv, totals_path, totals_rows, ["Metric", "Value"]),
+        ]
+        for w in writes:
+            w.result()  # surface any write error
+
+    # 7. Print summary
     print(f"Plans:                {len(rows)}")
     print(f"Prioritized Reqs:     ${total_pri_adjusted / 1e9:.2f}bn")
     print(f"Funding:              ${total_funding / 1e9:.2f}bn")
@@ -224,4 +416,10 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="always re-fetch from the API, ignoring the same-day cache",
+    )
+    args = parser.parse_args()
+    main(use_cache=not args.no_cache)